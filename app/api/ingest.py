@@ -1,24 +1,105 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from typing import List
+from typing import Iterable, Iterator, List
+from itertools import islice
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
 import shutil
 
+import aiofiles
+from langchain_core.documents import Document
+
 from app.config import settings
 from app.ingestion.loader import DocumentLoader
 from app.ingestion.splitter import TextSplitter
+from app.retrieval.query_cache import QueryCache
 from app.retrieval.vectorstore import VectorStore
-from app.dependencies import get_document_loader, get_text_splitter, get_vectorstore
+from app.dependencies import (
+    get_document_loader, get_text_splitter, get_vectorstore, get_process_pool, get_query_cache,
+    reset_process_pool
+)
 from models.schemas import IngestResponse
 
 router = APIRouter()
 
+# Tamaño de cada bloque leído del upload (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Chunks que se vectorizan y guardan juntos durante la ingesta
+INGEST_BATCH_SIZE = 256
+
+
+def chunk_stream(documents: Iterable[Document], splitter: TextSplitter) -> Iterator[Document]:
+    """
+    Genera los chunks de los documentos uno a uno (preservando metadata)
+
+    Al ser un generador, los chunks no se materializan todos en una lista.
+    El preview de /debug se corta aquí una sola vez y viaja en la metadata.
+    """
+    for doc in documents:
+        text_chunks = splitter.split_text(doc.page_content)
+        total = len(text_chunks)
+        for index, chunk_text in enumerate(text_chunks):
+            yield Document(
+                page_content=chunk_text,
+                metadata={
+                    **doc.metadata,
+                    'chunk_id': index,
+                    'total_chunks': total,
+                    'preview': chunk_text[:settings.PREVIEW_LENGTH]
+                }
+            )
+
+
+def index_in_batches(chunks: Iterator[Document], vectorstore: VectorStore) -> int:
+    """
+    Vectoriza y guarda los chunks en batches de INGEST_BATCH_SIZE
+
+    No persiste el índice (lo hace el llamador una vez al final).
+
+    Returns:
+        Cantidad de chunks guardados
+    """
+    count = 0
+    while batch := list(islice(chunks, INGEST_BATCH_SIZE)):
+        vectorstore.add_documents(batch, persist=False)
+        count += len(batch)
+    return count
+
+
+def _submit_load(
+    loop: asyncio.AbstractEventLoop,
+    pool: ProcessPoolExecutor,
+    loader: DocumentLoader,
+    file_path: Path,
+    pending: dict
+) -> ProcessPoolExecutor:
+    """
+    Encola el parseo de un archivo en el pool y lo registra en pending
+
+    Si el pool ya está roto se recrea y se vuelve a encolar.
+
+    Returns:
+        El pool en uso (el nuevo si hubo que recrearlo)
+    """
+    try:
+        future = loop.run_in_executor(pool, loader.load_file, file_path)
+    except BrokenProcessPool:
+        pool = reset_process_pool(pool)
+        future = loop.run_in_executor(pool, loader.load_file, file_path)
+    pending[future] = file_path
+    return pool
+
 
 @router.post("/upload", response_model=IngestResponse)
 async def ingest_documents(
     files: List[UploadFile] = File(...),
     loader: DocumentLoader = Depends(get_document_loader),
     splitter: TextSplitter = Depends(get_text_splitter),
-    vectorstore: VectorStore = Depends(get_vectorstore)
+    vectorstore: VectorStore = Depends(get_vectorstore),
+    pool: ProcessPoolExecutor = Depends(get_process_pool),
+    query_cache: QueryCache = Depends(get_query_cache)
 ):
     """
     Endpoint para subir documentos y procesarlos
@@ -50,11 +131,12 @@ async def ingest_documents(
             print(f"⚠️  Ignorando {file.filename} (formato no soportado)")
             continue
         
-        # Guardar archivo
+        # Guardar archivo por bloques, sin bloquear el event loop
         file_path = data_dir / file.filename # pyright: ignore[reportOperatorIssue]
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await buffer.write(chunk)
             saved_files.append(file_path)
             print(f"💾 Guardado: {file.filename}")
         except Exception as e:
@@ -67,68 +149,84 @@ async def ingest_documents(
             detail="No se pudo guardar ningún archivo válido"
         )
     
-    # === PASO 2: Cargar documentos ===
+    # === PASO 2-4: Cargar, dividir, vectorizar y guardar (en streaming) ===
+    # Cada archivo se parsea en el pool de procesos; en cuanto uno termina,
+    # sus chunks se generan de a poco y se guardan en batches, así en
+    # memoria nunca hay más de INGEST_BATCH_SIZE chunks a la vez.
     print(" Cargando documentos...")
-    all_documents = []
+    loop = asyncio.get_running_loop()
+    pending = {}
+    # Archivos ya reintentados tras romperse el pool (no se reintentan dos veces)
+    retried = set()
+    files_loaded = 0
+    chunks_created = 0
 
-    for file_path in saved_files:
-        try:
-            docs = loader.load_file(file_path)
-            all_documents.extend(docs)
-        except Exception as e:
-            print(f" Error cargando {file_path.name}: {str(e)}")
-            continue
+    try:
+        for file_path in saved_files:
+            pool = _submit_load(loop, pool, loader, file_path, pending)
+
+        while pending:
+            done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                try:
+                    documents = future.result()
+                except BrokenProcessPool:
+                    # Un worker murió y arrastró a todos los archivos en curso:
+                    # se recrea el pool y cada uno se reintenta una vez
+                    if file_path in retried:
+                        print(f" Error cargando {file_path.name}: el parser terminó abruptamente")
+                        continue
+                    retried.add(file_path)
+                    pool = _submit_load(loop, reset_process_pool(pool), loader, file_path, pending)
+                    continue
+                except Exception as e:
+                    print(f" Error cargando {file_path.name}: {str(e)}")
+                    continue
 
-    if not all_documents:
+                files_loaded += 1
+                print(f"Vectorizando y guardando {file_path.name}...")
+                chunks_created += await asyncio.to_thread(
+                    index_in_batches, chunk_stream(documents, splitter), vectorstore
+                )
+        print(f"Total de chunks: {chunks_created}")
+    except Exception as e:
+        for future in pending:
+            future.cancel()
         raise HTTPException(
             status_code=500,
-            detail="No se pudo procesar ningún documento"
+            detail=f"Error creando vectorstore: {str(e)}"
         )
-    
-
-    # === PASO 3: Dividir en chunks ===
-    print(" Dividiendo en chunks...")
-    all_chunks = []
-
-    for doc in all_documents:
-        #Dividir el texto
-        text_chunks = splitter.split_text(doc.page_content)
-
-        #Crear Documents para cada chunk (preservando metadata)
-        for index, chunk_text in enumerate(text_chunks):
-            from langchain_core.documents import Document
-            chunk_doc = Document(
-                page_content=chunk_text,
-                metadata={
-                    **doc.metadata,
-                    'chuink_id': index,
-                    'total_chunks': len(text_chunks)
-                }
-            )
-            all_chunks.append(chunk_doc)
-    print(f"Total de chunks: {len(all_chunks)}")
+    finally:
+        # Persistir también si la ingesta se cortó: los batches ya guardados
+        # deben quedar en disco igual que sus filas (FAISS escribe el índice
+        # completo solo aquí)
+        try:
+            await asyncio.to_thread(vectorstore.persist)
+        except Exception as e:
+            print(f" Error persistiendo el vectorstore: {str(e)}")
+        # La base cambió (aunque sea parcialmente): invalidar resultados cacheados
+        query_cache.clear()
 
-    # === PASO 4: Vectorizar y guardar en Chroma ===
-    print("Vectorizando y guardando en Chroma...")
-    try:
-        vectorstore.create_from_documents(all_chunks)
-        print("Vectorstore creado exitosamente.")
-    except Exception as e:
+    if not files_loaded:
         raise HTTPException(
             status_code=500,
-            detail=f"Error creando vectorstore: {str(e)}"
+            detail="No se pudo procesar ningún documento"
         )
     
     # === Respuesta ===
     return IngestResponse(
         message="Documentos procesados exitosamente",
         files_proccessed=len(saved_files),
-        chunks_created=len(all_chunks)
+        chunks_created=chunks_created
     )
 
 
 @router.delete("/clear")
-async def clear_data():
+async def clear_data(
+    vectorstore: VectorStore = Depends(get_vectorstore),
+    query_cache: QueryCache = Depends(get_query_cache)
+):
     """
     Endpoint para limpiar todos los datos
     
@@ -137,17 +235,12 @@ async def clear_data():
     - Base vectorial en vector_db/
     """
     try:
-        #Limpia data/
-        data_dir = Path(settings.DATA_DIR)
-        if data_dir.exists():
-            for item in data_dir.iterdir():
-                if item.is_file():
-                    item.unlink()
-        #Limpiar vector_db/
-        vector_db_dir = Path(settings.VECTORDB_DIR)
-        if vector_db_dir.exists():
-            shutil.rmtree(vector_db_dir)
-            vector_db_dir.mkdir()
+        # Soltar la colección/índice en memoria antes de borrar sus archivos
+        await asyncio.to_thread(vectorstore.delete_collection)
+        #Limpia data/ y vector_db/ (en un hilo: pueden ser miles de archivos)
+        await asyncio.to_thread(_reset_directory, Path(settings.DATA_DIR))
+        await asyncio.to_thread(_reset_directory, Path(settings.VECTORDB_DIR))
+        query_cache.clear()
         return {"message": "Datos limpiados exitosamente"}
     except Exception as e:
         raise HTTPException(
@@ -155,3 +248,8 @@ async def clear_data():
             detail=f"Error limpiando datos: {str(e)}"
         )
 
+
+def _reset_directory(directory: Path) -> None:
+    """Borra el directorio completo y lo vuelve a crear vacío"""
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True, exist_ok=True)
@@ -1,14 +1,17 @@
 """
 Query API - Endpoint para consultar el RAG
 """
+import asyncio
+from typing import Any, Dict, List
+
 from fastapi import APIRouter, HTTPException, Depends
-from langchain_google_genai  import ChatGoogleGenerativeAI
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
-from pydantic import SecretStr
+from pydantic import SecretStr, TypeAdapter
 
-from app.config import settings
+from app.retrieval.query_cache import QueryCache
 from app.retrieval.retriever import Retriever
-from app.dependencies import get_retriever
+from app.dependencies import get_retriever, get_query_cache, get_llm
 from models.schemas import QueryRequest, QueryResponse, SourceInfo
 
 router = APIRouter()
@@ -30,11 +33,19 @@ PREGUNTA: {question}
 
 RESPUESTA:"""
 
+# Se parsea una sola vez; por request solo se ejecuta .format()
+_PROMPT = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
+
+# Validador de la lista de fuentes, compilado una sola vez
+_SOURCE_INFO_LIST = TypeAdapter(List[SourceInfo])
+
 
 @router.post("/ask", response_model=QueryResponse)
 async def query_rag(
     request: QueryRequest,
-    retriever: Retriever = Depends(get_retriever)
+    retriever: Retriever = Depends(get_retriever),
+    query_cache: QueryCache = Depends(get_query_cache),
+    llm: BaseChatModel = Depends(get_llm)
 ):
     """
     Endpoint para hacer consultas al RAG
@@ -54,17 +65,25 @@ async def query_rag(
     
     # === PASO 1: Recuperar contexto relevante ===
     print(f"\n🔍 Buscando contexto para: '{request.question}'")
-    
-    try:
-        retrieval_results = retriever.retrieve(
-            query=request.question,
-            top_k=request.top_k if request.top_k is not None else 5  # Usa 5 o el valor por defecto que prefieras
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error recuperando contexto: {str(e)}"
-        )
+    top_k = request.top_k if request.top_k is not None else 5  # Usa 5 o el valor por defecto que prefieras
+
+    score_threshold = request.score_threshold
+
+    retrieval_results = query_cache.get(request.question, top_k, score_threshold=score_threshold)
+    if retrieval_results is None:
+        try:
+            retrieval_results = await asyncio.to_thread(
+                retriever.retrieve,
+                query=request.question,
+                top_k=top_k,
+                score_threshold=score_threshold
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error recuperando contexto: {str(e)}"
+            )
+        query_cache.put(request.question, top_k, retrieval_results, score_threshold=score_threshold)
     
     # Validar que haya contexto
     if not retrieval_results["context"]:
@@ -74,14 +93,14 @@ async def query_rag(
         )
     
     context = retrieval_results["context"]
-    chunks = retrieval_results["chunks"]
+    texts = retrieval_results["texts"]
+    metadatas = retrieval_results["metadatas"]
     sources = retrieval_results["sources"]
     
-    print(f"✅ Encontrados {len(chunks)} chunks de {len(sources)} fuente(s)")
+    print(f"✅ Encontrados {len(texts)} chunks de {len(sources)} fuente(s)")
     
     # === PASO 2: Construir prompt ===
-    prompt = ChatPromptTemplate.from_template(RAG_PROMPT_TEMPLATE)
-    formatted_prompt = prompt.format(
+    formatted_prompt = _PROMPT.format(
         context=context,
         question=request.question
     )
@@ -90,16 +109,8 @@ async def query_rag(
     print("🤖 Generando respuesta con Azure OpenAI...")
     
     try:
-        # Inicializar el LLM
-        llm = ChatGoogleGenerativeAI(  # type: ignore[call-arg]
-            model=settings.GEMINI_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.3,  # Baja para respuestas determinísticas
-            convert_system_message_to_human=True  # Gemini no soporta system messages nativamente
-        )
-        
         # Generar respuesta
-        response = llm.invoke(formatted_prompt)
+        response = await llm.ainvoke(formatted_prompt)
         answer = response.content
         if not isinstance(answer, str):
             answer = str(answer)
@@ -111,20 +122,22 @@ async def query_rag(
         )
     
     # === PASO 4: Formatear respuesta con fuentes ===
-    source_infos = []
-    for chunk in chunks:
-        source_infos.append(SourceInfo(
-            filename=chunk.metadata.get('source', 'desconocido'),
-            chunk_id=chunk.metadata.get('chunk_id', 0),
-            content_preview=chunk.page_content[:150] + "..."
-        ))
+    # Se validan todas las fuentes en una sola llamada
+    source_infos = _SOURCE_INFO_LIST.validate_python([
+        {
+            "filename": metadata.get('source', 'desconocido'),
+            "chunk_id": metadata.get('chunk_id', 0),
+            "content_preview": text[:150] + "..."
+        }
+        for text, metadata in zip(texts, metadatas)
+    ])
     
     print("✅ Respuesta generada exitosamente\n")
     
     return QueryResponse(
         answer=answer,
         source=source_infos,
-        chunk_used=len(chunks)
+        chunk_used=len(texts)
     )
 
 
@@ -140,26 +153,79 @@ async def debug_retrieval(
     o para ajustar parámetros de chunking
     """
     try:
-        results = retriever.retrieve_with_scores(
+        results = await asyncio.to_thread(
+            retriever.retrieve_with_scores,
             query=request.question,
-            top_k=request.top_k if request.top_k is not None else 5  # Usa 5 o el valor por defecto que prefieras
+            top_k=request.top_k if request.top_k is not None else 5,  # Usa 5 o el valor por defecto que prefieras
+            score_threshold=request.score_threshold
         )
         
-        return {
-            "query": request.question,
-            "top_k": request.top_k,
-            "results": [
-                {
-                    "score": r["score"],
-                    "source": r["metadata"].get("source"),
-                    "chunk_id": r["metadata"].get("chunk_id"),
-                    "preview": r["preview"]
-                }
-                for r in results
-            ]
-        }
+        return _debug_payload(request, results)
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error en debug: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/batch", response_model=list)
+async def batch_retrieval(
+    requests: List[QueryRequest],
+    retriever: Retriever = Depends(get_retriever)
+):
+    """
+    Endpoint para recuperar chunks de muchas consultas a la vez
+
+    Pensado para evaluaciones masivas: todas las preguntas se vectorizan
+    en una sola llamada y se buscan juntas. Retorna, por cada consulta,
+    lo mismo que /debug.
+    """
+    if not requests:
+        return []
+
+    top_ks = [r.top_k if r.top_k is not None else 5 for r in requests]
+    try:
+        batch_results = await asyncio.to_thread(
+            retriever.retrieve_batch_with_scores,
+            queries=[r.question for r in requests],
+            top_k=max(top_ks)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error en batch: {str(e)}"
+        )
+
+    return [
+        _debug_payload(request, [
+            r for r in results[:top_k]
+            if request.score_threshold is None or r["score"] <= request.score_threshold
+        ])
+        for request, top_k, results in zip(requests, top_ks, batch_results)
+    ]
+
+
+def _debug_payload(request: QueryRequest, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Formato de respuesta compartido por /debug y /batch"""
+    return {
+        "query": request.question,
+        "top_k": request.top_k,
+        "score_threshold": request.score_threshold,
+        "results": [
+            {
+                "score": r["score"],
+                "source": r["metadata"].get("source"),
+                "chunk_id": r["metadata"].get("chunk_id"),
+                "preview": r["preview"]
+            }
+            for r in results
+        ]
+    }
+
+
+@router.get("/cache_stats", response_model=dict)
+async def cache_stats(query_cache: QueryCache = Depends(get_query_cache)):
+    """
+    Estadísticas del cache de consultas (hits, misses, evictions...)
+    """
+    return query_cache.stats()
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,22 +12,81 @@ class Settings:
 
 
     #=== Directorios ===
-    BASE_DIR: str = os.getcwd()
+    # Raíz del proyecto (no el cwd): así las rutas no cambian según desde
+    # dónde se lance uvicorn y no se crea una segunda base vectorial vacía
+    BASE_DIR: str = str(Path(__file__).resolve().parent.parent)
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
     VECTORDB_DIR: str = os.path.join(BASE_DIR, "vector_db")
+    # Cache de embeddings de chunks; fuera de VECTORDB_DIR para sobrevivir a /clear
+    EMBED_CACHE_DIR: str = os.path.join(BASE_DIR, "embed_cache")
 
 
     #=== Parámetros de  chunking ===
     CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", 800))
     CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", 150))
+    # recursive | structural (corta por títulos/secciones)
+    SPLITTER_STRATEGY: str = os.getenv("SPLITTER_STRATEGY", "recursive")
+    # Caracteres del preview de cada chunk (se guarda en la metadata al ingestar)
+    PREVIEW_LENGTH: int = 200
 
 
-settings = Settings()
+    #=== Parseo de documentos ===
+    # auto | standard | ocr (auto usa OCR solo si el PDF no tiene texto)
+    PARSER_STRATEGY: str = os.getenv("PARSER_STRATEGY", "auto")
+
+
+    #=== Base vectorial ===
+    # chroma | faiss
+    VECTORSTORE_BACKEND: str = os.getenv("VECTORSTORE_BACKEND", "chroma")
+    # Parámetros del grafo HNSW
+    HNSW_M: int = int(os.getenv("HNSW_M", 32))
+    HNSW_EF_CONSTRUCTION: int = int(os.getenv("HNSW_EF_CONSTRUCTION", 200))
+    HNSW_EF_SEARCH: int = int(os.getenv("HNSW_EF_SEARCH", 64))
+    # none | int8 | fp16 (cuantización escalar de los vectores guardados)
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    # Tipo de índice FAISS: hnsw | flat (exacto) | ivfpq (corpus grandes)
+    FAISS_INDEX_TYPE: str = os.getenv("FAISS_INDEX_TYPE", "hnsw")
+    FAISS_NLIST: int = int(os.getenv("FAISS_NLIST", 4096))
+    FAISS_PQ_M: int = int(os.getenv("FAISS_PQ_M", 64))
+    FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", 16))
+    # Candidatos por resultado para re-ranking (solo donde cambia el resultado, ver
+    # Retriever._search_many); 1 = sin re-ranking
+    RERANK_OVERFETCH: int = int(os.getenv("RERANK_OVERFETCH", 4))
+
+
+    #=== Cache de consultas ===
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", 2000))
+    QUERY_CACHE_TTL: int = int(os.getenv("QUERY_CACHE_TTL", 600))
 
-os.makedirs(settings.DATA_DIR, exist_ok=True)
-os.makedirs(settings.VECTORDB_DIR, exist_ok=True)
+
+    #=== Logging ===
+    # DEBUG | INFO | WARNING | ERROR
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+
+    def ensure_directories(self) -> None:
+        """Crea los directorios de datos si no existen (se llama al iniciar la app)"""
+        os.makedirs(self.DATA_DIR, exist_ok=True)
+        os.makedirs(self.VECTORDB_DIR, exist_ok=True)
+        os.makedirs(self.EMBED_CACHE_DIR, exist_ok=True)
+
+
+settings = Settings()
 
 if not settings.GOOGLE_API_KEY:
     raise ValueError("La variable de entorno GOOGLE_API_KEY no está configurada.")
 if not settings.GEMINI_MODEL:
-    raise ValueError("La variable de entorno GEMINI_MODEL no está configurada.")
\ No newline at end of file
+    raise ValueError("La variable de entorno GEMINI_MODEL no está configurada.")
+if settings.SPLITTER_STRATEGY not in ("recursive", "structural"):
+    raise ValueError("SPLITTER_STRATEGY debe ser 'recursive' o 'structural'.")
+if settings.PARSER_STRATEGY not in ("auto", "standard", "ocr"):
+    raise ValueError("PARSER_STRATEGY debe ser 'auto', 'standard' o 'ocr'.")
+if settings.VECTORSTORE_BACKEND not in ("chroma", "faiss"):
+    raise ValueError("VECTORSTORE_BACKEND debe ser 'chroma' o 'faiss'.")
+if settings.VECTOR_QUANTIZATION not in ("none", "int8", "fp16"):
+    raise ValueError("VECTOR_QUANTIZATION debe ser 'none', 'int8' o 'fp16'.")
+if settings.FAISS_INDEX_TYPE not in ("hnsw", "flat", "ivfpq"):
+    raise ValueError("FAISS_INDEX_TYPE debe ser 'hnsw', 'flat' o 'ivfpq'.")
+if settings.LOG_LEVEL not in ("DEBUG", "INFO", "WARNING", "ERROR"):
+    raise ValueError("LOG_LEVEL debe ser 'DEBUG', 'INFO', 'WARNING' o 'ERROR'.")
+if settings.RERANK_OVERFETCH < 1:
+    raise ValueError("RERANK_OVERFETCH debe ser mayor o igual a 1.")
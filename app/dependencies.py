@@ -1,7 +1,13 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
+from langchain_core.language_models import BaseChatModel
+from app.config import settings
+from app.retrieval.query_cache import QueryCache
 from app.retrieval.retriever import Retriever
 from app.ingestion.loader import DocumentLoader
-from app.ingestion.splitter import TextSplitter
+from app.ingestion.splitter import TextSplitter, StructuralSplitter
 from app.ingestion.embedder import Embedder
 from app.retrieval.vectorstore import VectorStore
 
@@ -17,18 +23,58 @@ def get_document_loader() -> DocumentLoader:
 
     return DocumentLoader()
 
+@lru_cache()
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Retorna el pool de procesos singleton para parsear documentos
+
+    Extraer texto de PDFs es trabajo de CPU, así que se reparte entre
+    procesos. El pool vive mientras viva la app y se cierra en el shutdown.
+
+    Los workers se crean con "spawn": hacer fork de un proceso con hilos
+    (uvicorn, el loop del embedder, clientes gRPC) puede copiar locks
+    tomados y colgar al worker.
+    """
+
+    return ProcessPoolExecutor(
+        max_workers=min(os.cpu_count() or 1, 8),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+def reset_process_pool(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """
+    Reemplaza el pool de procesos tras un BrokenProcessPool
+
+    Si un worker muere (OOM, segfault en un parser) el pool queda roto para
+    siempre; se descarta el singleton y se crea uno nuevo. Si otro request
+    ya lo reemplazó, se retorna ese.
+    """
+
+    if get_process_pool() is broken:
+        get_process_pool.cache_clear()
+    broken.shutdown(wait=False, cancel_futures=True)
+    return get_process_pool()
+
 @lru_cache()
 def get_text_splitter() -> TextSplitter:
     """
     Retorna instancia singleton de TextSplitter
+
+    Con SPLITTER_STRATEGY=structural retorna un StructuralSplitter
     """
 
+    if settings.SPLITTER_STRATEGY == "structural":
+        return StructuralSplitter()
     return TextSplitter()
 
 @lru_cache()
 def get_embedder() -> Embedder:
     """
     Retorna instancia singleton de Embedder
+
+    Todo el proceso (ingesta, búsquedas, warmup) comparte su cliente de
+    Gemini y por lo tanto sus conexiones keep-alive: el handshake TLS se
+    paga una vez, no por request.
     """
 
     return Embedder()
@@ -37,12 +83,37 @@ def get_embedder() -> Embedder:
 def get_vectorstore() -> VectorStore:
     """
     Retorna instancia singleton de VectorStore
+
+    Con VECTORSTORE_BACKEND=faiss retorna un FAISSVectorStore (misma interfaz).
+    El import es local para no cargar faiss cuando se usa Chroma.
     """
 
-    return VectorStore()
+    if settings.VECTORSTORE_BACKEND == "faiss":
+        from app.retrieval.faiss_store import FAISSVectorStore
+        return FAISSVectorStore(embedder=get_embedder())  # type: ignore[return-value]
+
+    return VectorStore(embedder=get_embedder())
 
 # ===== Retrieval Dependencies =====
 
+@lru_cache()
+def get_llm() -> BaseChatModel:
+    """
+    Retorna instancia singleton del LLM de Gemini
+
+    Crearlo una sola vez evita reconstruir el cliente HTTP y las
+    credenciales en cada consulta. langchain_google_genai se importa
+    aquí para que importar la app no cargue los módulos de Google.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(  # type: ignore[call-arg]
+        model=settings.GEMINI_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY,
+        temperature=0.3,  # Baja para respuestas determinísticas
+        convert_system_message_to_human=True  # Gemini no soporta system messages nativamente
+    )
+
 @lru_cache()
 def get_retriever() -> Retriever:
     """
@@ -51,10 +122,23 @@ def get_retriever() -> Retriever:
     Esta es la dependencia principal para consultas
     """
 
-    retriever = Retriever()
+    # Comparte el vectorstore con /ingest, así ve los documentos recién indexados
+    retriever = Retriever(vectorstore=get_vectorstore())
 
     # Intenta cargar vectorstore existente
     if not retriever.initialize():
         print(" Advertencia: No hay vectorestrore. Ejecuta /ingest primero")
 
-    return retriever
\ No newline at end of file
+    return retriever
+@lru_cache()
+def get_query_cache() -> QueryCache:
+    """
+    Retorna instancia singleton de QueryCache
+
+    Compartida entre /query (lectura) e /ingest (invalidación)
+    """
+
+    return QueryCache(
+        max_size=settings.QUERY_CACHE_SIZE,
+        ttl_seconds=settings.QUERY_CACHE_TTL
+    )
@@ -1,5 +1,16 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+import asyncio
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import List, Tuple
 from app.config import settings
+from app.ingestion.embedding_cache import EmbeddingCache
+
+# Máximo de textos por llamada a embed_documents en la API de Gemini
+EMBED_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
 
 class Embedder:
 
@@ -22,15 +33,46 @@ class Embedder:
         """
         Inicializa el embedder de Gemini
         
+        El cliente de Gemini no se crea aquí sino en el primer uso (ver
+        la propiedad embedder): importar este módulo o construir la app
+        no paga la carga de los módulos de Google.
+        """
+        self._embedder = None
+        self._embedder_lock = threading.Lock()
+
+        # Cache de embeddings de consultas, por instancia (no retiene la clase).
+        # No depende del corpus: solo cambiaría con otro modelo de embeddings.
+        self._query_vectors = lru_cache(maxsize=4096)(self._embed_query_tuple)
+
+        # Vectores de chunks ya calculados, persistidos entre ingestas y reinicios
+        self.cache = EmbeddingCache(
+            os.path.join(settings.EMBED_CACHE_DIR, "embeddings.sqlite3"),
+            model=settings.GEMINI_EMBED_MODEL
+        )
+
+        # Event loop propio para las llamadas async de embeddings (ver _run)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        """
+        Cliente GoogleGenerativeAIEmbeddings, creado la primera vez que se usa
+
         GoogleGenerativeAIEmbeddings es un wrapper de LangChain que:
         - Maneja la autenticación con Google
         - Gestiona rate limits automáticamente
         - Convierte respuestas al formato estándar de LangChain
         """
-        self.embedder = GoogleGenerativeAIEmbeddings(
-            model=settings.GEMINI_EMBED_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY # type: ignore
-        )
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                    self._embedder = GoogleGenerativeAIEmbeddings(
+                        model=settings.GEMINI_EMBED_MODEL,
+                        google_api_key=settings.GOOGLE_API_KEY # type: ignore
+                    )
+        return self._embedder
 
     def embed_chunks(self, chunks):
         """
@@ -55,6 +97,103 @@ class Embedder:
         """
 
         return self.embedder.embed_documents(chunks)
+
+    async def embed_chunks_batched(
+        self,
+        chunks: List[str],
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = 8
+    ) -> List[List[float]]:
+        """
+        Genera embeddings en batches, con varios batches en vuelo a la vez
+
+        embed_documents procesa los batches uno detrás de otro; aquí cada
+        batch (máx. EMBED_BATCH_SIZE textos por llamada) se envía con el
+        cliente async nativo (aembed_documents), sin ocupar un hilo por
+        llamada, y se limitan las llamadas simultáneas con un semáforo.
+
+        Args:
+            chunks: Lista de strings a vectorizar
+            batch_size: Textos por llamada a la API
+            max_concurrency: Llamadas simultáneas como máximo
+
+        Returns:
+            Lista de vectores en el mismo orden que chunks
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+        done = 0
+
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            nonlocal done
+            async with semaphore:
+                vectors = await self.embedder.aembed_documents(batch, batch_size=batch_size)
+            done += len(batch)
+            logger.info("Embeddings: %d/%d", done, len(chunks))
+            return vectors
+
+        results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_unique(self, chunks: List[str]) -> List[List[float]]:
+        """
+        Vectoriza solo los textos distintos y que no estén en el cache en disco
+
+        Encabezados, pies de página y páginas de copyright se repiten
+        literalmente entre páginas y archivos, y re-ingestar un documento
+        repite todos sus chunks; no tiene sentido pagarlos más de una vez
+        a la API. Los vectores nuevos se guardan en self.cache.
+
+        Bloquea hasta terminar, así que no se debe llamar desde el event
+        loop (usar asyncio.to_thread).
+
+        Returns:
+            Un vector por cada texto de entrada (mismo orden)
+        """
+        position_by_key = {}
+        unique_keys = []
+        unique_texts = []
+        positions = []
+        for text in chunks:
+            key = self.cache.key(text)
+            position = position_by_key.get(key)
+            if position is None:
+                position = position_by_key[key] = len(unique_texts)
+                unique_keys.append(key)
+                unique_texts.append(text)
+            positions.append(position)
+
+        if len(unique_texts) < len(chunks):
+            logger.info("Skipping %d duplicated chunks", len(chunks) - len(unique_texts))
+
+        cached = self.cache.get_many(unique_keys)
+        missing = [i for i, key in enumerate(unique_keys) if key not in cached]
+        if cached:
+            logger.info("Reusing %d cached embeddings", len(cached))
+
+        new_vectors = self._run(self.embed_chunks_batched([unique_texts[i] for i in missing]))
+        self.cache.put_many([unique_keys[i] for i in missing], new_vectors)
+        cached.update(zip((unique_keys[i] for i in missing), new_vectors))
+
+        return [cached[unique_keys[position]] for position in positions]
+
+    def _run(self, coro):
+        """
+        Ejecuta una corrutina en el event loop del embedder y espera el resultado
+
+        El cliente async de Gemini guarda conexiones ligadas al loop en que
+        se usó por primera vez; con asyncio.run (un loop nuevo por llamada)
+        la siguiente ingesta reutilizaría conexiones de un loop ya cerrado.
+        Por eso todas las llamadas async van a un único loop que vive en
+        un hilo daemon propio.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever, name="embedder-loop", daemon=True
+                ).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
     
     def embed_query(self, query: str):
         """
@@ -78,6 +217,35 @@ class Embedder:
         """
 
         return self.embedder.embed_query(query)
+
+    def _embed_query_tuple(self, query: str) -> Tuple[float, ...]:
+        """Embedding de la query como tupla (inmutable, segura de cachear)"""
+        return tuple(self.embedder.embed_query(query))
+
+    def embed_query_cached(self, query: str) -> List[float]:
+        """
+        Igual que embed_query, pero memoizado por texto de la pregunta
+
+        La misma pregunta (repetida, o buscada con y sin scores) solo paga
+        una llamada a la API.
+        """
+        return list(self._query_vectors(query))
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embeddings de varias consultas en una sola llamada a la API
+
+        Usa el task_type de consultas (igual que embed_query), no el de
+        documentos, para que los vectores sean comparables.
+
+        Args:
+            queries: Preguntas de los usuarios
+
+        Returns:
+            Un vector por pregunta, en el mismo orden
+        """
+
+        return self.embedder.embed_documents(queries, task_type="RETRIEVAL_QUERY")
     
     def get_embedding_dimension(self) -> int:
         """
@@ -0,0 +1,82 @@
+"""
+EmbeddingCache - Cache en disco de embeddings de chunks (SQLite)
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+# Máximo de parámetros por consulta IN (...) en SQLite antiguos
+LOOKUP_BATCH_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    Guarda el vector de cada texto ya vectorizado, indexado por SHA-256
+
+    Re-ingestar los mismos documentos (o documentos que comparten
+    encabezados, pies de página, etc.) no vuelve a llamar a la API.
+
+    - La clave incluye el modelo de embeddings: cambiar de modelo no
+      reutiliza vectores incompatibles
+    - Los vectores se guardan en float32, sin redondear: un chunk servido
+      desde el cache se indexa igual que uno recién vectorizado
+    - Vive fuera de VECTORDB_DIR, así /clear no lo borra
+    - Thread-safe: una sola conexión protegida con un lock
+    """
+
+    def __init__(self, path: str, model: str):
+        """
+        Args:
+            path: Archivo SQLite del cache (se crea si no existe)
+            model: Nombre del modelo de embeddings (parte de la clave)
+        """
+        self.model = model
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # La tabla "embeddings" de versiones anteriores guardaba float16
+        self._db.execute("DROP TABLE IF EXISTS embeddings")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings_f32 (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+
+    def key(self, text: str) -> bytes:
+        """SHA-256 de modelo + texto"""
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """
+        Busca varias claves a la vez
+
+        Returns:
+            Dict clave -> vector solo con las claves encontradas
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT hash, vec FROM embeddings_f32 WHERE hash IN ({placeholders})", batch
+                ).fetchall()
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]) -> None:
+        """Guarda los vectores nuevos en una sola transacción"""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings_f32 (hash, vec) VALUES (?, ?)",
+                (
+                    (key, np.asarray(vector, dtype=np.float32).tobytes())
+                    for key, vector in zip(keys, vectors)
+                )
+            )
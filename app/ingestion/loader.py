@@ -3,11 +3,23 @@
     suported formats: PDF, TXT, DOCX
 """
 
+from enum import Enum
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+from pypdf import PdfReader
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_community.document_loaders.word_document import Docx2txtLoader
+from langchain_community.vectorstores.utils import filter_complex_metadata
 from langchain_core.documents import Document
+from app.config import settings
+
+
+class ParserStrategy(str, Enum):
+    """Parser tier used for PDFs (see settings.PARSER_STRATEGY)"""
+    AUTO = "auto"          # PyPDFLoader, or OCR when the PDF has no text layer
+    STANDARD = "standard"  # PyPDFLoader
+    OCR = "ocr"            # UnstructuredPDFLoader (needs `unstructured`)
+
 
 class DocumentLoader:
     """
@@ -24,6 +36,12 @@ class DocumentLoader:
         ".docx": Docx2txtLoader
     }
 
+    # Pages inspected by _classify, spread evenly over the document; a
+    # single image cover must not send a born-digital PDF to OCR
+    CLASSIFY_SAMPLE_PAGES = 5
+    # Below this many characters per page the text layer is considered empty
+    OCR_MIN_CHARS = 20
+
     @classmethod
     def load_file(cls, file_path: Path) -> List[Document]:
         """Upload document and return list of documents
@@ -42,12 +60,15 @@ class DocumentLoader:
                              f"Suported formats: {list(cls.SUPORTED_EXTENSIONS.keys())}"
                         )
         
-        # Select the appropriate loader based on file extension
-        loader_class = cls.SUPORTED_EXTENSIONS[extension]
-        loader = loader_class(str(file_path))
+        if extension == ".pdf":
+            documents = cls._load_pdf(file_path)
+        else:
+            # Select the appropriate loader based on file extension
+            loader_class = cls.SUPORTED_EXTENSIONS[extension]
+            loader = loader_class(str(file_path))
 
-        #load documents can be multiple (PDF with multiple pages)
-        documents = loader.load()
+            #load documents can be multiple (PDF with multiple pages)
+            documents = loader.load()
 
         # Add metada information for tracking
         for doc in documents:
@@ -59,6 +80,107 @@ class DocumentLoader:
         
         return documents
     
+    @classmethod
+    def _has_fonts(cls, resources, depth: int = 0) -> bool:
+        """True if a /Resources dict (or a form XObject inside it) declares fonts"""
+
+        if resources is None:
+            return False
+        resources = resources.get_object()
+        if resources.get("/Font"):
+            return True
+        if depth >= 2:
+            return False
+        for xobject in (resources.get("/XObject") or {}).values():
+            xobject = xobject.get_object()
+            if xobject.get("/Subtype") == "/Form" and cls._has_fonts(xobject.get("/Resources"), depth + 1):
+                return True
+        return False
+
+    @staticmethod
+    def _page_resources(page):
+        """/Resources of a page, walking up /Parent when it is inherited"""
+
+        node = page
+        while node is not None:
+            node = node.get_object()
+            if "/Resources" in node:
+                return node["/Resources"]
+            node = node.get("/Parent")
+        return None
+
+    @classmethod
+    def _classify(cls, file_path: Path) -> ParserStrategy:
+        """Pick OCR only for PDFs without a text layer
+
+        Checks a sample of pages for font resources (inherited ones and
+        those inside form XObjects included). Only dictionaries are read,
+        no text is extracted, so the check is cheap next to the parse.
+        """
+
+        reader = PdfReader(str(file_path))
+        total = len(reader.pages)
+        if not total:
+            return ParserStrategy.STANDARD
+
+        sample = min(total, cls.CLASSIFY_SAMPLE_PAGES)
+        indexes = sorted({i * total // sample for i in range(sample)})
+        if any(cls._has_fonts(cls._page_resources(reader.pages[i])) for i in indexes):
+            return ParserStrategy.STANDARD
+        return ParserStrategy.OCR
+
+    @classmethod
+    def _load_pdf(cls, file_path: Path) -> List[Document]:
+        """Load a PDF with the tier from settings.PARSER_STRATEGY
+
+        In AUTO mode PDFs without fonts go to OCR (see _classify); PDFs
+        whose text layer comes out (almost) empty from PyPDFLoader, like
+        scans with an invisible font, are retried with OCR too.
+        """
+
+        strategy = ParserStrategy(settings.PARSER_STRATEGY)
+        auto = strategy is ParserStrategy.AUTO
+        if auto:
+            strategy = cls._classify(file_path)
+
+        if strategy is ParserStrategy.OCR:
+            documents = cls._load_pdf_ocr(file_path)
+            if documents is not None:
+                return documents
+
+        documents = PyPDFLoader(str(file_path)).load()
+        if auto and documents:
+            chars = sum(len(doc.page_content.strip()) for doc in documents)
+            if chars < cls.OCR_MIN_CHARS * len(documents):
+                return cls._load_pdf_ocr(file_path) or documents
+        return documents
+
+    @staticmethod
+    def _load_pdf_ocr(file_path: Path) -> Optional[List[Document]]:
+        """Load a PDF with UnstructuredPDFLoader, or None if it is not installed
+
+        Unstructured adds list/dict metadata (languages, coordinates) that
+        Chroma rejects; lists of strings are joined and anything else
+        that is not a plain value is dropped.
+        """
+
+        try:
+            from langchain_community.document_loaders import UnstructuredPDFLoader
+            documents = UnstructuredPDFLoader(str(file_path), mode="paged").load()
+        except ImportError:
+            print(f" OCR loader not available, using PyPDFLoader for {file_path.name}")
+            return None
+
+        for doc in documents:
+            # Unstructured stores a 1-based "page_number"; the rest of the
+            # pipeline expects the 0-based "page" used by PyPDFLoader
+            if "page_number" in doc.metadata:
+                doc.metadata["page"] = doc.metadata["page_number"] - 1
+            for key, value in list(doc.metadata.items()):
+                if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+                    doc.metadata[key] = ", ".join(value)
+        return filter_complex_metadata(documents)
+
     @classmethod
     def load_directory(cls, directory: Path) -> List[Document]:
         """Upload all documents supported in a directory
@@ -1,15 +1,81 @@
+import re
+from typing import List
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.config import settings
 
 class TextSplitter:
-    @staticmethod
-    def split_text(text: str):
-        """Divide el texto en chunks usando parámetros definidos en la configuración."""
-        splitter = RecursiveCharacterTextSplitter(
+    def __init__(self):
+        """Crea el splitter una sola vez con los parámetros de la configuración."""
+        self._splitter = RecursiveCharacterTextSplitter(
             chunk_size=settings.CHUNK_SIZE,
             chunk_overlap=settings.CHUNK_OVERLAP,
             separators=["\n\n", "\n", " ", ""]
         )
-        chunks = splitter.split_text(text)
-        return chunks
 
+    def split_text(self, text: str):
+        """Divide el texto en chunks usando parámetros definidos en la configuración."""
+        return self._splitter.split_text(text)
+
+
+class StructuralSplitter(TextSplitter):
+    """
+    Divide el texto por su estructura (títulos y párrafos) en vez de a ciegas
+
+    1. Detecta líneas de título (markdown "# ...", numeradas "2.1 Alcance"
+       o cortas en MAYÚSCULAS) y agrupa cada título con su contenido
+    2. Junta secciones consecutivas mientras quepan en CHUNK_SIZE, así
+       los cortes caen siempre entre secciones y no a mitad de una idea
+    3. Solo las secciones más largas que CHUNK_SIZE se cortan con el
+       splitter recursivo
+
+    Resultado: menos chunks (menos embeddings y vectores) y cada uno con
+    contexto completo.
+    """
+
+    HEADING_MAX_LENGTH = 80
+    _MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+    _NUMBERED_HEADING = re.compile(r"^\d+(\.\d+)*\.?\s+[A-ZÁÉÍÓÚÑ]")
+
+    @classmethod
+    def _is_heading(cls, line: str) -> bool:
+        """True si la línea parece un título de sección"""
+        if not line or len(line) > cls.HEADING_MAX_LENGTH:
+            return False
+        if cls._MARKDOWN_HEADING.match(line) or cls._NUMBERED_HEADING.match(line):
+            return True
+        letters = [c for c in line if c.isalpha()]
+        return len(letters) >= 3 and line.isupper() and not line.endswith(".")
+
+    def _sections(self, text: str) -> List[str]:
+        """Agrupa las líneas en secciones que empiezan en cada título"""
+        sections = []
+        current = []
+        for line in text.splitlines():
+            if self._is_heading(line.strip()) and current:
+                sections.append("\n".join(current).strip())
+                current = []
+            current.append(line)
+        if current:
+            sections.append("\n".join(current).strip())
+        return [section for section in sections if section]
+
+    def split_text(self, text: str):
+        """Divide el texto en chunks alineados a secciones, de hasta CHUNK_SIZE caracteres."""
+        chunks = []
+        current = ""
+        for section in self._sections(text):
+            if len(section) > settings.CHUNK_SIZE:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.extend(self._splitter.split_text(section))
+            elif not current:
+                current = section
+            elif len(current) + 2 + len(section) <= settings.CHUNK_SIZE:
+                current = f"{current}\n\n{section}"
+            else:
+                chunks.append(current)
+                current = section
+        if current:
+            chunks.append(current)
+        return chunks
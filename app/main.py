@@ -1,9 +1,75 @@
+import asyncio
+import logging
+import queue
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI
 from app.api.ingest import router as ingest_router
 from app.api.query import router as query_router
+from app.config import settings
+from app.dependencies import (
+    get_document_loader, get_text_splitter, get_embedder, get_vectorstore, get_retriever,
+    get_llm, get_process_pool
+)
 
 
-app = FastAPI(title="RAG Intro Project")
+def configure_logging() -> QueueListener:
+    """
+    Configura los loggers de la app ("app.*") para escribir desde un hilo aparte
+
+    Los módulos solo encolan el registro (QueueHandler); un QueueListener
+    lo formatea y escribe a stderr. Así los requests y los hilos de
+    ingesta no se bloquean en la escritura a consola.
+
+    Returns:
+        El listener ya iniciado (hay que detenerlo al apagar la app)
+    """
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.LOG_LEVEL)
+    app_logger.handlers = [QueueHandler(log_queue)]
+    app_logger.propagate = False
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+
+def warm_up() -> None:
+    """
+    Crea los singletons y hace un embedding de prueba antes del primer request
+
+    Así la primera consulta no paga la creación de clientes, la carga de
+    Chroma ni el handshake TLS con la API de Google.
+    """
+    get_document_loader()
+    get_text_splitter()
+    embedder = get_embedder()
+    get_vectorstore()
+    get_retriever()
+    get_llm()
+    try:
+        embedder.embed_query("warmup")
+    except Exception as e:
+        # Sin red o sin cuota: la app arranca igual, solo sin precalentar
+        print(f" Warm-up de embeddings falló: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = configure_logging()
+    settings.ensure_directories()
+    await asyncio.to_thread(warm_up)
+    yield
+    # Cerrar el pool de procesos de parseo al apagar la app
+    get_process_pool().shutdown(wait=False, cancel_futures=True)
+    log_listener.stop()
+
+
+app = FastAPI(title="RAG Intro Project", lifespan=lifespan)
 
 app.include_router(ingest_router, prefix="/ingest", tags=["Ingestion"])
 app.include_router(query_router, prefix="/query", tags=["Query"])
@@ -0,0 +1,515 @@
+""" FAISSVectorStore - Store and search vectors with a FAISS index (HNSW, flat or IVF-PQ)
+    Same interface as VectorStore; selected with VECTORSTORE_BACKEND=faiss
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from app.config import settings
+from app.ingestion.embedder import Embedder
+
+logger = logging.getLogger(__name__)
+
+
+class FAISSVectorStore:
+    """
+    Base vectorial con índice FAISS + SQLite para textos y metadata
+
+    A diferencia de Chroma:
+    - El índice vive completo en memoria como arrays contiguos
+    - Con HNSW la búsqueda cuesta ~O(log N) (limitada por ef_search);
+      con flat es exacta; con IVF-PQ solo recorre nprobe clusters
+    - Los textos y la metadata se guardan aparte en SQLite, con el
+      id de fila igual a la posición del vector en el índice
+
+    Los vectores se normalizan y se usa producto interno, o sea similitud
+    de coseno. El score retornado es distancia de coseno (1 - similitud),
+    así que igual que en Chroma: menor score = MÁS similar.
+    """
+
+    INDEX_FILE = "faiss.index"
+    DB_FILE = "faiss_chunks.sqlite3"
+    # Bits por código de PQ (index_factory usa 8: 256 centroides por subvector)
+    PQ_NBITS = 8
+    # Vectores de entrenamiento por centroide que pide el k-means de FAISS
+    TRAIN_POINTS_PER_CENTROID = 39
+    # VECTOR_QUANTIZATION -> tipo de cuantización escalar de FAISS
+    SCALAR_QUANTIZERS = {
+        "int8": faiss.ScalarQuantizer.QT_8bit,
+        "fp16": faiss.ScalarQuantizer.QT_fp16
+    }
+
+    def __init__(self, embedder: Embedder):
+        """
+        Guarda el embedder y las rutas; el índice se carga o crea después
+
+        Args:
+            embedder: Embedder compartido (ver dependencies.get_embedder)
+        """
+        self.embedder = embedder
+
+        self.persist_directory = settings.VECTORDB_DIR
+        self.index_path = os.path.join(self.persist_directory, self.INDEX_FILE)
+        self.db_path = os.path.join(self.persist_directory, self.DB_FILE)
+
+        self.index = None
+        self._db = None
+        # FAISS no admite add() concurrente con search()
+        self._lock = threading.RLock()
+        self._building_ivfpq = False
+
+    @property
+    def embeddings(self):
+        """Cliente de embeddings de LangChain (se crea en el primer uso)"""
+        return self.embedder.embedder
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre (una sola vez) la base SQLite con textos y metadata"""
+        if self._db is None:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            # WAL + fsync solo en checkpoints: las inserciones no esperan
+            # al disco en cada commit; caché y mmap grandes para las lecturas
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("PRAGMA cache_size=-262144")
+            self._db.execute("PRAGMA mmap_size=30000000000")
+            self._db.execute("PRAGMA temp_store=MEMORY")
+            self._db.execute("PRAGMA wal_autocheckpoint=10000")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+        return self._db
+
+    @staticmethod
+    def _prefetch_file(path: str) -> None:
+        """
+        Pide al kernel que lea el archivo completo al page cache (WILLNEED)
+
+        La lectura ocurre en segundo plano, así read_index y las primeras
+        consultas a SQLite no se bloquean en fallos de página uno por uno.
+        Solo disponible en POSIX; en otros sistemas no hace nada.
+        """
+        if not hasattr(os, "posix_fadvise") or not os.path.exists(path):
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _new_index(dimension: int) -> faiss.Index:
+        """
+        Crea un índice vacío del tipo configurado en FAISS_INDEX_TYPE
+
+        - hnsw: grafo HNSW con los parámetros de settings
+        - flat: búsqueda exacta (IndexFlatIP), la más rápida y sin
+          parámetros para corpus chicos (< 100K vectores)
+        - ivfpq: arranca como flat y pasa a IVF-PQ al juntar vectores
+          suficientes para entrenarlo (ver _maybe_build_ivfpq)
+
+        Con VECTOR_QUANTIZATION=int8|fp16 los vectores se guardan con
+        cuantización escalar (IndexHNSWSQ / IndexScalarQuantizer): 4x
+        (int8) o 2x (fp16) menos memoria y ancho de banda en el cálculo
+        de distancias; la query se compara en float32 contra los códigos.
+        int8 requiere entrenarse (rango de cada dimensión) con el primer
+        batch agregado. En ivfpq no aplica: PQ ya comprime los vectores.
+        """
+        quantizer = FAISSVectorStore.SCALAR_QUANTIZERS.get(settings.VECTOR_QUANTIZATION)
+        if settings.FAISS_INDEX_TYPE == "ivfpq":
+            return faiss.IndexFlatIP(dimension)
+        if settings.FAISS_INDEX_TYPE == "flat":
+            if quantizer is not None:
+                return faiss.IndexScalarQuantizer(dimension, quantizer, faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexFlatIP(dimension)
+
+        if quantizer is not None:
+            index = faiss.IndexHNSWSQ(dimension, quantizer, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        return index
+
+    @staticmethod
+    def _configure_search(index: faiss.Index) -> None:
+        """
+        Aplica los parámetros de búsqueda de settings según el tipo de índice
+
+        En IVF además arma el mapa id -> posición que necesita reconstruct
+        (lo usa raw_search_many para devolver los vectores candidatos).
+        """
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            return
+        ivf.nprobe = settings.FAISS_NPROBE
+        ivf.make_direct_map()
+
+    def _maybe_build_ivfpq(self) -> None:
+        """
+        Reemplaza el índice flat por uno IVF-PQ cuando ya se puede entrenar
+
+        El k-means de FAISS necesita ~39 vectores por centroide, tanto
+        para los FAISS_NLIST clusters como para los 2 ** PQ_NBITS
+        centroides de cada subvector de PQ; hasta juntarlos se busca en
+        el flat (exacto). Al alcanzar el mínimo se entrena con todos los
+        vectores guardados y se vuelven a agregar en el mismo orden, así
+        los ids de SQLite siguen coincidiendo con las posiciones.
+
+        El entrenamiento (lento) corre fuera del lock: búsquedas e
+        ingestas siguen usando el flat mientras tanto. Al terminar se
+        agregan los vectores que llegaron en el intervalo y se cambia
+        el índice.
+        """
+        if settings.FAISS_INDEX_TYPE != "ivfpq":
+            return
+
+        with self._lock:
+            flat = self.index
+            if self._building_ivfpq or not isinstance(flat, faiss.IndexFlat):
+                return
+            centroids = max(settings.FAISS_NLIST, 2 ** self.PQ_NBITS)
+            if flat.ntotal < self.TRAIN_POINTS_PER_CENTROID * centroids:
+                return
+            self._building_ivfpq = True
+            snapshot = flat.ntotal
+            vectors = flat.reconstruct_n(0, snapshot)
+
+        try:
+            logger.info("Building IVF-PQ index from %d vectors...", snapshot)
+            index = faiss.index_factory(
+                flat.d,
+                f"IVF{settings.FAISS_NLIST},PQ{settings.FAISS_PQ_M}x{self.PQ_NBITS}",
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+            index.add(vectors)
+            self._configure_search(index)
+
+            with self._lock:
+                # /clear o una recarga reemplazaron el flat: descartar
+                if self.index is not flat:
+                    return
+                if flat.ntotal > snapshot:
+                    index.add(flat.reconstruct_n(snapshot, flat.ntotal - snapshot))
+                self.index = index
+        finally:
+            with self._lock:
+                self._building_ivfpq = False
+
+    @staticmethod
+    def _as_matrix(vectors) -> np.ndarray:
+        """Convierte a matriz float32 contigua y normaliza cada fila (L2)"""
+        matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def create_from_documents(self, documents: List[Document]) -> None:
+        """
+        Crea (o abre) el índice y guarda los documentos
+
+        Igual que VectorStore: si ya existe un índice, se agregan a él.
+
+        Args:
+            documents: Lista de Documents ya chunkeados
+        """
+        logger.info("Creating FAISS index with %d chunks...", len(documents))
+
+        self._open_index()
+        self._embed_and_add(documents)
+        self.persist()
+
+        logger.info("FAISS index saved in %s.", self.persist_directory)
+        logger.info("Total of chunks indexed: %d", len(documents))
+
+    def _open_index(self) -> None:
+        """Carga el índice persistido si existe y aún no está en memoria"""
+        with self._lock:
+            if self.index is None and os.path.exists(self.index_path):
+                self.load_existing()
+
+    def _embed_and_add(self, documents: List[Document]) -> None:
+        """Vectoriza los documentos y los agrega al índice (sin persistir)"""
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        vectors = self._as_matrix(self.embedder.embed_unique(texts))
+
+        with self._lock:
+            if self.index is None:
+                self.index = self._new_index(vectors.shape[1])
+            if not self.index.is_trained:
+                self.index.train(vectors)
+
+            start = self.index.ntotal
+            db = self._connect()
+            with db:
+                # Filas huérfanas de una ingesta cuyo índice no llegó a disco
+                db.execute("DELETE FROM chunks WHERE id >= ?", (start,))
+                db.executemany(
+                    "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                    (
+                        (start + offset, text, json.dumps(metadata, ensure_ascii=False, default=str))
+                        for offset, (text, metadata) in enumerate(zip(texts, metadatas))
+                    )
+                )
+            self.index.add(vectors)
+
+        self._maybe_build_ivfpq()
+
+    def _reconcile(self) -> None:
+        """
+        Descarta las filas de SQLite sin vector en el índice cargado
+
+        Las filas se confirman por batch, pero el índice se escribe a disco
+        al final de la ingesta; si el proceso se cortó en medio, SQLite
+        queda con ids >= ntotal que el índice no tiene (y que la próxima
+        ingesta volvería a usar).
+        """
+        db = self._connect()
+        with db:
+            deleted = db.execute(
+                "DELETE FROM chunks WHERE id >= ?", (self.index.ntotal,)
+            ).rowcount
+        if deleted:
+            logger.warning("Removed %d chunks without vectors in the FAISS index.", deleted)
+
+    def persist(self) -> None:
+        """
+        Escribe el índice a disco
+
+        Reescribe el archivo completo, por eso en ingestas por batches se
+        llama una sola vez al final y no después de cada batch.
+        """
+        with self._lock:
+            if self.index is not None:
+                faiss.write_index(self.index, self.index_path)
+
+    def load_existing(self) -> bool:
+        """
+        Carga el índice FAISS y la base SQLite desde disco
+
+        Returns:
+            True si se cargó correctamente, False si no existe o está vacío
+        """
+        try:
+            if not os.path.exists(self.index_path):
+                logger.info("No existing FAISS index found.")
+                return False
+
+            self._prefetch_file(self.index_path)
+            self._prefetch_file(self.db_path)
+
+            with self._lock:
+                self.index = faiss.read_index(self.index_path)
+                self._configure_search(self.index)
+                self._reconcile()
+
+            count = self.index.ntotal
+            if count == 0:
+                logger.info("FAISS index is empty.")
+                return False
+            logger.info("Loaded existing FAISS index with %d chunks.", count)
+            return True
+        except Exception as e:
+            logger.error("Error loading FAISS index: %s", e)
+            return False
+
+    def add_documents(self, documents: List[Document], persist: bool = True) -> None:
+        """
+        Agrega nuevos documentos al índice (lo carga o crea si hace falta)
+
+        Args:
+            documents: Lista de Documents a agregar
+            persist: Si es False no se escribe el índice a disco; el
+                llamador debe invocar persist() al terminar
+        """
+        logger.info("Adding %d new chunks to FAISS index...", len(documents))
+        self._open_index()
+        self._embed_and_add(documents)
+        if persist:
+            self.persist()
+        logger.info("New chunks added successfully.")
+
+    def _fetch_rows(self, ids: Sequence[int]) -> Dict[int, Tuple[str, dict]]:
+        """Recupera textos y metadata de SQLite como dict id -> (texto, metadata)"""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._connect().execute(
+            f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})",
+            list(ids)
+        ).fetchall()
+        return {row_id: (text, json.loads(metadata)) for row_id, text, metadata in rows}
+
+    @property
+    def exact_scores(self) -> bool:
+        """
+        True si el índice guarda los vectores completos (flat o HNSW sin cuantizar)
+
+        En ese caso las distancias de la búsqueda ya son exactas y
+        re-puntuar los candidatos no cambia el orden.
+        """
+        return isinstance(self.index, (faiss.IndexFlat, faiss.IndexHNSWFlat))
+
+    @property
+    def search_ef(self) -> Optional[int]:
+        """ef_search del grafo HNSW, o None si el índice no es HNSW"""
+        if hasattr(self.index, "hnsw"):
+            return self.index.hnsw.efSearch
+        return None
+
+    def raw_search_many(
+        self, embeddings: List[List[float]], k: int = 3, include_embeddings: bool = False
+    ) -> List[Tuple[List[str], List[dict], List[float], Optional[np.ndarray]]]:
+        """
+        Busca varias consultas ya vectorizadas y retorna columnas por consulta
+
+        Las consultas se ejecutan agrupadas por cluster (ver _query_buckets)
+        y los resultados se devuelven en el orden original.
+
+        Con include_embeddings los vectores salen del cache de embeddings
+        (los originales, en float32) y no del índice: con int8/fp16/PQ el
+        índice solo tiene versiones aproximadas, y re-puntuar con ellas
+        daría el mismo orden que la búsqueda. Si un texto no está en el
+        cache se usa el vector reconstruido desde el índice.
+
+        Returns:
+            Por cada embedding, (textos, metadatas, distancias de coseno,
+            vectores o None), ordenados de más a menos similar
+        """
+        if self.index is None:
+            raise ValueError("Vector store is not initialized. Load or create a vector store first.")
+
+        queries = self._as_matrix(embeddings)
+        similarities = np.empty((len(queries), k), dtype=np.float32)
+        ids = np.empty((len(queries), k), dtype=np.int64)
+
+        with self._lock:
+            for rows in self._query_buckets(queries):
+                similarities[rows], ids[rows] = self.index.search(queries[rows], k)
+
+            # FAISS rellena con -1 cuando hay menos de k vectores
+            hits = [
+                [(int(i), float(s)) for i, s in zip(row_ids, row_similarities) if i != -1]
+                for row_ids, row_similarities in zip(ids, similarities)
+            ]
+            rows_by_id = self._fetch_rows(sorted({i for row in hits for i, _ in row}))
+            reconstructed = [
+                self.index.reconstruct_batch(np.asarray([i for i, _ in row], dtype=np.int64))
+                if include_embeddings and row else None
+                for row in hits
+            ]
+
+        results = []
+        for row, row_vectors in zip(hits, reconstructed):
+            texts = [rows_by_id[i][0] for i, _ in row]
+            metadatas = [rows_by_id[i][1] for i, _ in row]
+            distances = [1.0 - similarity for _, similarity in row]
+            results.append((texts, metadatas, distances, self._original_vectors(texts, row_vectors)))
+        return results
+
+    def _original_vectors(self, texts: List[str], reconstructed: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Vectores originales desde el cache de embeddings (reconstruidos si faltan)"""
+        if reconstructed is None:
+            return None
+        cache = self.embedder.cache
+        keys = [cache.key(text) for text in texts]
+        originals = cache.get_many(keys)
+        return np.asarray([
+            originals.get(key, row) for key, row in zip(keys, reconstructed)
+        ], dtype=np.float32)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 3
+    ) -> List[Tuple[Document, float]]:
+        """
+        Busca los k vectores más cercanos a un embedding ya calculado
+
+        Returns:
+            Lista de tuplas (Document, distancia de coseno)
+        """
+        texts, metadatas, distances, _ = self.raw_search_many([embedding], k=k)[0]
+        return [
+            (Document(page_content=text, metadata=metadata), distance)
+            for text, metadata, distance in zip(texts, metadatas, distances)
+        ]
+
+    def _query_buckets(self, queries: np.ndarray) -> List[np.ndarray]:
+        """
+        Agrupa consultas que visitan los mismos clusters (índices IVF)
+
+        En un índice IVF cada consulta recorre sus nprobe listas más
+        cercanas. Ejecutar juntas las consultas que comparten el cluster
+        principal hace que cada lista se lea de memoria una sola vez por
+        grupo en vez de una vez por consulta. Para HNSW/Flat no hay
+        clusters y se ejecuta todo en un solo batch.
+
+        Returns:
+            Lista de arrays con los índices de fila de cada grupo
+        """
+        try:
+            ivf = faiss.extract_index_ivf(self.index)
+        except RuntimeError:
+            return [np.arange(len(queries))]
+
+        _, centroids = ivf.quantizer.search(queries, 1)
+        buckets = {}
+        for row, centroid in enumerate(centroids[:, 0].tolist()):
+            buckets.setdefault(centroid, []).append(row)
+        return [np.asarray(rows) for _, rows in sorted(buckets.items())]
+
+    def similarity_search(self, query: str, k: int = 3) -> List[Document]:
+        """
+        Busca los k documentos más similares a la query
+
+        Args:
+            query: Pregunta del usuario
+            k: Número de resultados a retornar
+
+        Returns:
+            Lista de Documents más relevantes ordenados por similitud
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 3) -> List[tuple]:
+        """
+        Busca documentos con sus scores (distancia de coseno, menor = más similar)
+
+        Returns:
+            Lista de tuplas: (Document, score)
+        """
+        if self.index is None:
+            raise ValueError("Vector store is not initialized. Load or create a vector store first.")
+        embedding = self.embedder.embed_query_cached(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k)
+
+    def delete_collection(self) -> None:
+        """
+        Elimina el índice y todos los chunks guardados
+        """
+        with self._lock:
+            if self.index is None and self._db is None:
+                logger.info("Vector store is not initialized. Nothing to delete.")
+                return
+
+            self.index = None
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            for path in (self.index_path, self.db_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info("FAISS index deleted.")
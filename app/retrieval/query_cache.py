@@ -0,0 +1,91 @@
+"""
+QueryCache - Cache LRU con TTL para resultados de retrieval
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class QueryCache:
+    """
+    Cache en memoria de los resultados de Retriever.retrieve
+
+    Evita volver a vectorizar la pregunta y buscar en Chroma cuando llega
+    la misma consulta (mismo texto normalizado, top_k y score_threshold).
+
+    - LRU: al superar max_size se descarta la entrada usada hace más tiempo
+    - TTL: una entrada vence a los ttl_seconds de guardada
+    - Thread-safe: se usa desde el event loop y desde hilos de trabajo
+
+    ⚠️ Hay que llamar a clear() cada vez que cambia la base vectorial
+    (ingesta o /clear), si no se servirían resultados viejos.
+    """
+
+    def __init__(self, max_size: int = 2000, ttl_seconds: float = 600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (expira_en, valor), ordenado de menos a más reciente
+        self._entries: "OrderedDict[Tuple[str, int, Optional[float]], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(question: str, top_k: int, score_threshold: Optional[float]) -> Tuple[str, int, Optional[float]]:
+        """Normaliza la pregunta: minúsculas y espacios colapsados"""
+        return " ".join(question.lower().split()), top_k, score_threshold
+
+    def get(self, question: str, top_k: int, *, score_threshold: Optional[float] = None) -> Optional[Any]:
+        """
+        Retorna el resultado cacheado o None si no existe o ya venció
+        """
+        key = self._key(question, top_k, score_threshold)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, question: str, top_k: int, value: Any, *, score_threshold: Optional[float] = None) -> None:
+        """Guarda un resultado, descartando los más antiguos si no cabe"""
+        key = self._key(question, top_k, score_threshold)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Invalida todo el cache (las estadísticas se conservan)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso del cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,8 +1,15 @@
-from typing import List, Dict, Any
+from itertools import starmap
+from typing import List, Dict, Any, Optional
+import numpy as np
 from langchain_core.documents import Document
-from sympy import preview
+from app.config import settings
+from app.retrieval.sim import cosine_topk
 from app.retrieval.vectorstore import VectorStore
 
+# Formato de cada chunk en el contexto: [Fuente - Página X - Chunk Y]
+# Campos posicionales: fuente, página, chunk_id, contenido
+_CTX_TPL = "[{0} - Pág.{1} - Chunk {2}]\n{3}\n"
+
 
 class Retriever:
     """
@@ -14,9 +21,15 @@ class Retriever:
     - Puede agregar lógica adicional (filtros, re-ranking, etc)
     """
 
-    def __init__(self):
-        """Inicializa el vectorstore"""
-        self.vectorstore = VectorStore()
+    def __init__(self, vectorstore: VectorStore):
+        """
+        Inicializa el vectorstore
+
+        Args:
+            vectorstore: Instancia a usar (VectorStore o FAISSVectorStore),
+                normalmente get_vectorstore()
+        """
+        self.vectorstore = vectorstore
 
     def initialize(self) -> bool:
         """
@@ -28,59 +41,115 @@ class Retriever:
 
         return self.vectorstore.load_existing()
     
-    def retrieve(self, query: str, top_k: int = 3) -> Dict[str, Any]:
+    def retrieve(self, query: str, top_k: int = 3, score_threshold: Optional[float] = None) -> Dict[str, Any]:
         """
         Recupera los chunks más relevantes para una query
         
         Args:
             query: Pregunta del usuario
             top_k: Número de chunks a recuperar
+            score_threshold: Distancia máxima para usar un chunk; los más
+                lejanos no entran al contexto (menos tokens para Gemini)
             
         Returns:
             Dict con:
-            - chunks: Lista de Documents
+            - texts: Textos de los chunks (de más a menos similar)
+            - metadatas: Metadata de cada chunk (misma posición que texts)
             - context: String con todo el contexto concatenado
             - sources: Lista de fuentes únicas
         """
-        # Buscar documentos similares
-        results = self.vectorstore.similarity_search(query, k=top_k)
+        # Buscar con la API nativa: columnas paralelas, sin crear Documents
+        # (el embedding de la query se cachea)
+        vector = self.vectorstore.embedder.embed_query_cached(query)
+        texts, metadatas, distances = self._search_many([vector], top_k)[0]
+
+        if score_threshold is not None:
+            rows = [row for row in zip(texts, metadatas, distances) if row[2] <= score_threshold]
+            texts = [text for text, _, _ in rows]
+            metadatas = [metadata for _, metadata, _ in rows]
 
-        if not results:
+        if not texts:
             return {
-                "chunks": [],
+                "texts": [],
+                "metadatas": [],
                 "context": "",
                 "sources": []
             }
         
+        # Una lista por campo de la metadata, alineadas con texts
+        sources_list = [md.get('source', 'unknown source') for md in metadatas]
+        pages = [md.get('page', 'unknown page') for md in metadatas]
+        chunk_ids = [md.get('chunk_id', 'unknown id') for md in metadatas]
+
         # Formatear contexto para el prompt
-        #Cada chunk se numera y se identifica por su fuente
-        context_parts = []
-        sources = set()
-
-        for index, doc in enumerate(results, 1):
-            source = doc.metadata.get('source', 'unknown source')
-            page = doc.metadata.get('page', 'unknown page')
-            chunk_id = doc.metadata.get('chunk_id', 'unknown id')
-
-            sources.add(source)
-
-            #Formato: [Fuente - Págnina X - Chunk Y]
-            context_parts.append(
-                f"[{source} - Pág.{page} - Chunk {chunk_id}]\n"
-                f"{doc.page_content}\n"
-            )
-        context = "\n---\n".join(context_parts)
+        #Cada chunk se numera y se identifica por su fuente (ver _CTX_TPL)
+        context = "\n---\n".join(
+            starmap(_CTX_TPL.format, zip(sources_list, pages, chunk_ids, texts))
+        )
+        sources = set(sources_list)
         return {
-            "chunks": results,
+            "texts": texts,
+            "metadatas": metadatas,
             "context": context,
             "sources": list(sources)
         }
     
-    def retrieve_with_scores(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _search_many(self, vectors: List[List[float]], top_k: int) -> List[tuple]:
+        """
+        Busca varias queries ya vectorizadas con re-ranking donde sirve
+
+        Solo se piden top_k * RERANK_OVERFETCH candidatos cuando eso puede
+        cambiar el resultado:
+        - Índice con vectores cuantizados (FAISS int8/fp16/PQ): los
+          candidatos se re-puntúan con coseno exacto sobre los vectores
+          originales y se quedan los top_k
+        - Índice HNSW con vectores completos: pedir más candidatos solo
+          amplía la búsqueda si supera ef_search (se busca con
+          max(ef, k)); las distancias ya son exactas, basta con cortar
+        En el resto de los casos (p. ej. Chroma con top_k <= 10 y
+        ef_search=64) se busca directamente top_k.
+
+        Returns:
+            Por cada vector, (textos, metadatas, distancias de coseno) con
+            top_k resultados como máximo
+        """
+        store = self.vectorstore
+        candidates = top_k * settings.RERANK_OVERFETCH
+        rerank = candidates > top_k and not store.exact_scores
+        widen = (
+            candidates > top_k and store.exact_scores
+            and store.search_ef is not None and candidates > store.search_ef
+        )
+        k = candidates if rerank or widen else top_k
+
+        results = store.raw_search_many(vectors, k=k, include_embeddings=rerank)
+        if not rerank:
+            return [
+                (texts[:top_k], metadatas[:top_k], distances[:top_k])
+                for texts, metadatas, distances, _ in results
+            ]
+
+        reranked = []
+        for vector, (texts, metadatas, _, embeddings) in zip(vectors, results):
+            if not texts:
+                reranked.append(([], [], []))
+                continue
+            order, similarities = cosine_topk(np.asarray(vector), np.asarray(embeddings), top_k)
+            reranked.append((
+                [texts[i] for i in order],
+                [metadatas[i] for i in order],
+                [1.0 - float(similarity) for similarity in similarities]
+            ))
+        return reranked
+
+    def retrieve_with_scores(
+        self, query: str, top_k: int = 3, score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
         """
         Recupera chunks con sus scores de similitud
         
-        Útil para debugging o para implementar threshold filtering
+        Usa la misma búsqueda (y re-ranking) que retrieve, así /debug
+        muestra exactamente los chunks que recibe /ask.
         
         Returns:
             Lista de dicts con:
@@ -88,14 +157,60 @@ class Retriever:
             - score: float (menor = más similar)
             - metadata: dict con info adicional
         """
-        results = self.vectorstore.similarity_search_with_score(query, k=top_k)
+        vector = self.vectorstore.embedder.embed_query_cached(query)
+        results = self._as_scored(*self._search_many([vector], top_k)[0])
+        return self._format_scored(self._filter_by_score(results, score_threshold))
+
+    def retrieve_batch_with_scores(self, queries: List[str], top_k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        Recupera chunks con scores para varias queries a la vez
 
+        Todas las preguntas se vectorizan en una sola llamada a la API y
+        se buscan juntas en el vectorstore (agrupadas por cluster si el
+        índice lo permite), con la misma búsqueda que retrieve.
+
+        Returns:
+            Por cada query, la misma lista que retrieve_with_scores
+        """
+        vectors = self.vectorstore.embedder.embed_queries(queries)
+        return [
+            self._format_scored(self._as_scored(texts, metadatas, distances))
+            for texts, metadatas, distances in self._search_many(vectors, top_k)
+        ]
+
+    @staticmethod
+    def _as_scored(texts: List[str], metadatas: List[dict], distances: List[float]) -> List[tuple]:
+        """Arma tuplas (Document, score) desde las columnas de _search_many"""
+        return [
+            (Document(page_content=text, metadata=metadata), distance)
+            for text, metadata, distance in zip(texts, metadatas, distances)
+        ]
+
+    @staticmethod
+    def _filter_by_score(results: List[tuple], score_threshold: Optional[float]) -> List[tuple]:
+        """Descarta las tuplas (Document, score) con distancia mayor al umbral"""
+        if score_threshold is None:
+            return results
+        return [(doc, score) for doc, score in results if score <= score_threshold]
+
+    @staticmethod
+    def _format_scored(results: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Convierte tuplas (Document, score) al formato de retrieve_with_scores
+
+        El preview viene precalculado en la metadata; los chunks ingestados
+        antes de guardarlo se cortan aquí.
+        """
         formatted_results = []
         for doc, score in results:
+            metadata = doc.metadata
+            preview = metadata.get("preview")
+            if preview is None:
+                preview = doc.page_content[:settings.PREVIEW_LENGTH]
             formatted_results.append({
                 "document": doc,
                 "score": score,
-                "metadata": doc.metadata,
-                "preview": doc.page_content[:200] + "..."
+                "metadata": metadata,
+                "preview": "".join((preview, "..."))
             })
         return formatted_results
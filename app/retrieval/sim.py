@@ -0,0 +1,52 @@
+"""
+Sim - Similitud de coseno vectorizada con NumPy
+
+Todo scoring en Python (re-ranking, MMR, deduplicación) debe pasar por
+aquí: una sola multiplicación matriz-vector (BLAS) en vez de un loop
+de cosine_similarity por documento.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Retorna una copia float32 contigua con cada fila de norma 1
+
+    Las filas de norma 0 quedan en 0 (en vez de NaN).
+    """
+    matrix = np.array(matrix, dtype=np.float32, order="C", ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def cosine_topk(query: np.ndarray, matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k filas de matrix más similares (coseno) a query
+
+    No modifica los arrays recibidos. Si matrix ya viene normalizada
+    (ver normalize_rows) conviene normalizarla una vez y reutilizarla.
+
+    Args:
+        query: Vector de la consulta, shape (d,)
+        matrix: Vectores candidatos, shape (n, d)
+        k: Cantidad de resultados
+
+    Returns:
+        (índices, scores) ordenados de mayor a menor similitud
+    """
+    query = normalize_rows(query)[0]
+    scores = normalize_rows(matrix) @ query
+
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = candidates[np.argsort(-scores[candidates])]
+    return order, scores[order]
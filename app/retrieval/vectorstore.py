@@ -1,12 +1,37 @@
 """ VectorStore - Store  and search vectors
     Whe use Chroma for its simplicity and automatic persistence
 """
+import logging
 import os
-from typing import List
+import sqlite3
+import uuid
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from langchain_core.documents import Document
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from app.config import settings
+from app.ingestion.embedder import Embedder
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+
+logger = logging.getLogger(__name__)
+
+# Máximo de registros por llamada a collection.upsert
+UPSERT_BATCH_SIZE = 5000
+
+# Archivo SQLite donde Chroma persiste la colección
+CHROMA_DB_FILE = "chroma.sqlite3"
+
+COLLECTION_NAME = "rag_collection"
+# Colección temporal donde se copia la base al re-indexarla
+STAGING_COLLECTION_NAME = f"{COLLECTION_NAME}_reindex"
+
+# Parámetros HNSW que usa chromadb 0.4 cuando el segmento no tiene metadata
+CHROMA_HNSW_DEFAULTS = {
+    "hnsw:space": "l2",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 10
+}
 
 
 class VectorStore:
@@ -25,65 +50,286 @@ class VectorStore:
     - Qdrant (open source, más rápido)
     """
 
-    def __init__(self):
+    def __init__(self, embedder: Embedder):
         """
-        Inicializa el embedder de Gemini y prepara Chroma
+        Recibe el embedder de Gemini y prepara Chroma
         
-        ¿Por qué crear embedder aquí?
+        ¿Por qué recibir el embedder en vez de crearlo?
         - Chroma necesita el mismo embedder para:
           1. Vectorizar documentos al guardar
           2. Vectorizar queries al buscar
         - Si usas embedders diferentes, la búsqueda no funcionará
+        - Compartir el singleton de get_embedder evita un segundo cliente
+        
+        Args:
+            embedder: Embedder compartido (ver dependencies.get_embedder)
         """
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=settings.GEMINI_EMBED_MODEL,
-            google_api_key=settings.GOOGLE_API_KEY
-        )
+        self.embedder = embedder
 
         # Path to persist vector DB
         self.persist_directory = settings.VECTORDB_DIR
 
         # Vector Store (upload from disk if exist)
         self.vectorstore = None
+        # Parámetros HNSW con los que está construido el índice en disco
+        self.index_params = None
+
+    @property
+    def embeddings(self):
+        """Cliente de embeddings de LangChain (se crea en el primer uso)"""
+        return self.embedder.embedder
+
+    # Capacidades del índice que consulta Retriever._search_many (igual
+    # que las propiedades de FAISSVectorStore)
+
+    @property
+    def exact_scores(self) -> bool:
+        """Chroma guarda los vectores float32 completos: sus distancias ya son exactas"""
+        return True
 
+    @property
+    def search_ef(self) -> int:
+        """ef_search del índice en disco: Chroma busca con max(ef_search, k)"""
+        if self.index_params is None:
+            return settings.HNSW_EF_SEARCH
+        return self.index_params["hnsw:search_ef"]
 
     def create_from_documents(self, documents: List[Document]) -> None:
         """
-        Crea una nueva colección desde cero con los documentos
+        Crea (o abre) la colección y guarda los documentos
         
-        Flujo interno de Chroma.from_documents():
-        1. Por cada Document:
-           - Extrae page_content
-           - Llama a embeddings.embed_documents([texto])
-           - Google retorna vector de 768 dims
-        2. Genera un ID único para cada documento
-        3. Guarda en SQLite: (id, vector, texto, metadata)
-        4. Crea índice para búsqueda rápida
-        5. Persiste todo en persist_directory
+        Flujo:
+        1. Extrae page_content y metadata de cada Document
+        2. Vectoriza todos los textos en batches concurrentes
+           (Embedder.embed_chunks_batched)
+        3. Genera un ID único para cada documento
+        4. Guarda en SQLite: (id, vector, texto, metadata) vía upsert
+        5. Chroma persiste todo en persist_directory
         
-        ⚠️ IMPORTANTE: Esto SOBREESCRIBE la colección existente
+        ⚠️ IMPORTANTE: Si la colección ya existe, los documentos se agregan
+        a ella. Bloquea hasta terminar el embedding, así que no se debe
+        llamar desde el event loop (usar asyncio.to_thread).
         
         Args:
             documents: Lista de Documents ya chunkeados
         """
 
 
-        print(f"Creating vector store with {len(documents)} chunks...")
+        logger.info("Creating vector store with %d chunks...", len(documents))
+
+        self._open_collection()
+        self._embed_and_add(documents)
+
+        logger.info("Vector store created in %s.", self.persist_directory)
+        logger.info("Total of chunks indexed: %d", len(documents))
+
+    def _open_collection(self) -> "Chroma":
+        """Abre la colección persistida (la crea si no existe)"""
+        if self.vectorstore is None:
+            self.vectorstore = self._new_chroma()
+        return self.vectorstore
+
+    def _new_chroma(self) -> "Chroma":
+        """
+        Conecta con la colección de Chroma en persist_directory
+
+        Chroma (y chromadb) se importan aquí y no al cargar el módulo:
+        solo se paga la importación cuando de verdad se abre la base.
+
+        La metadata HNSW se envía solo al crear la colección: en una
+        existente chromadb la sobrescribiría sin reconstruir el índice.
+        Si el índice en disco se construyó con otros parámetros se
+        re-indexa (ver _reindex_collection).
+        """
+        import chromadb
+        from langchain_community.vectorstores import Chroma
+
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        self._finish_reindex(client)
+
+        wanted = self._collection_metadata()
+        params = self._read_index_params()
+        if params is not None and params != wanted:
+            params = self._reindex_collection(client, params, wanted)
 
-        #Chroma automatically:
-        # 1.- Extract the text from the documents
-        # 2.- Create embeddings using self.embeddings
-        # 3.- Store vectors and metadata 
-        # 4.- Persist data to disk
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
-            collection_name="rag_collection"
+        vectorstore = Chroma(
+            client=client,
+            embedding_function=self.embeddings,
+            collection_name=COLLECTION_NAME,
+            collection_metadata=wanted if params is None else None
         )
+        self.index_params = params or wanted
+        if self.index_params["hnsw:space"] != "cosine":
+            logger.warning(
+                "Vector store uses %s distances, not cosine: scores and "
+                "score_threshold are not comparable with FAISS",
+                self.index_params["hnsw:space"]
+            )
+        self._enable_wal()
+        return vectorstore
+
+    @staticmethod
+    def _collection_metadata() -> dict:
+        """
+        Parámetros del índice HNSW de la colección, tomados de settings
+
+        Con espacio coseno el score es 1 - similitud, igual que en
+        FAISSVectorStore.
+        """
+        return {
+            "hnsw:space": "cosine",
+            "hnsw:M": settings.HNSW_M,
+            "hnsw:construction_ef": settings.HNSW_EF_CONSTRUCTION,
+            "hnsw:search_ef": settings.HNSW_EF_SEARCH
+        }
+
+    def _read_index_params(self) -> Optional[dict]:
+        """
+        Lee los parámetros HNSW reales del segmento vectorial de la colección
+
+        La metadata de la colección no es confiable (versiones anteriores
+        la sobrescribían al abrirla); el índice usa la del segmento, que
+        chromadb copia una sola vez al crear la colección.
+
+        Returns:
+            Dict con las claves de _collection_metadata, o None si la
+            colección todavía no existe
+        """
+        db_path = os.path.join(self.persist_directory, CHROMA_DB_FILE)
+        if not os.path.exists(db_path):
+            return None
+
+        db = sqlite3.connect(db_path)
+        try:
+            if db.execute(
+                "SELECT 1 FROM collections WHERE name = ?", (COLLECTION_NAME,)
+            ).fetchone() is None:
+                return None
+            rows = db.execute(
+                """
+                SELECT sm.key, sm.str_value, sm.int_value, sm.float_value
+                FROM segment_metadata sm
+                JOIN segments s ON s.id = sm.segment_id
+                JOIN collections c ON c.id = s.collection
+                WHERE c.name = ? AND s.scope = 'VECTOR'
+                """,
+                (COLLECTION_NAME,)
+            ).fetchall()
+        finally:
+            db.close()
+
+        params = dict(CHROMA_HNSW_DEFAULTS)
+        for key, str_value, int_value, float_value in rows:
+            if key in params:
+                params[key] = next(v for v in (str_value, int_value, float_value) if v is not None)
+        return params
+
+    def _reindex_collection(self, client, current: dict, wanted: dict) -> dict:
+        """
+        Reconstruye la colección con los parámetros HNSW de settings
+
+        Copia ids, vectores, textos y metadatas a una colección nueva (sin
+        llamar a la API de embeddings) y después reemplaza la original.
+        Si algo falla se sigue usando la original con sus parámetros.
+
+        Returns:
+            Parámetros del índice que queda en uso
+        """
+        logger.info("Re-indexing vector store: %s -> %s", current, wanted)
+        try:
+            self._drop_collection(client, STAGING_COLLECTION_NAME)
+            source = client.get_collection(COLLECTION_NAME)
+            staging = client.create_collection(STAGING_COLLECTION_NAME, metadata=wanted)
+            for offset in range(0, source.count(), UPSERT_BATCH_SIZE):
+                batch = source.get(
+                    include=["embeddings", "documents", "metadatas"],
+                    limit=UPSERT_BATCH_SIZE,
+                    offset=offset
+                )
+                staging.add(
+                    ids=batch["ids"],
+                    embeddings=batch["embeddings"],
+                    documents=batch["documents"],
+                    metadatas=batch["metadatas"]
+                )
+        except Exception as e:
+            logger.error("Could not re-index vector store, keeping current index: %s", e)
+            self._drop_collection(client, STAGING_COLLECTION_NAME)
+            return current
+
+        client.delete_collection(COLLECTION_NAME)
+        staging.modify(name=COLLECTION_NAME)
+        logger.info("Vector store re-indexed.")
+        return wanted
+
+    def _finish_reindex(self, client) -> None:
+        """
+        Completa o descarta un re-indexado que se cortó a la mitad
 
-        print(f"Vector store created in {self.persist_directory}.")
-        print(f"Total of chunks indexed: {len(documents)}")
+        Si quedó solo la colección temporal (se cortó entre borrar la
+        original y renombrar) se renombra; si están las dos, se descarta
+        la temporal.
+        """
+        names = {collection.name for collection in client.list_collections()}
+        if STAGING_COLLECTION_NAME not in names:
+            return
+        if COLLECTION_NAME in names:
+            self._drop_collection(client, STAGING_COLLECTION_NAME)
+        else:
+            client.get_collection(STAGING_COLLECTION_NAME).modify(name=COLLECTION_NAME)
+
+    @staticmethod
+    def _drop_collection(client, name: str) -> None:
+        """Borra una colección si existe"""
+        try:
+            client.delete_collection(name)
+        except ValueError:
+            pass
+
+    def _enable_wal(self) -> None:
+        """
+        Cambia el SQLite de Chroma a journal WAL
+
+        Con el journal por defecto (DELETE) cada upsert hace varios fsync
+        y bloquea a los lectores; en WAL las escrituras son un append al
+        log y las búsquedas no esperan a la ingesta. El modo WAL queda
+        guardado en el archivo, así que basta una conexión propia: Chroma
+        no expone la suya. Si falla (p. ej. base bloqueada) se sigue con
+        el modo por defecto.
+        """
+        db_path = os.path.join(self.persist_directory, CHROMA_DB_FILE)
+        if not os.path.exists(db_path):
+            return
+        try:
+            db = sqlite3.connect(db_path)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logger.warning("Could not enable WAL on vector store: %s", e)
+
+    def _embed_and_add(self, documents: List[Document]) -> None:
+        """
+        Vectoriza los documentos y los inserta con los vectores ya calculados
+
+        Chroma solo recibe vectores precalculados, así el embedding queda
+        bajo nuestro control (batches en paralelo) en vez de en add_texts.
+        """
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        vectors = self.embedder.embed_unique(texts)
+        ids = [str(uuid.uuid4()) for _ in texts]
+
+        collection = self._open_collection()._collection
+        for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+            end = start + UPSERT_BATCH_SIZE
+            collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
 
     def load_existing(self) -> bool:
         """
@@ -100,51 +346,52 @@ class VectorStore:
         """
         try: 
             if not os.path.exists(self.persist_directory):
-                print("No existing vector store found.")
+                logger.info("No existing vector store found.")
                 return False
             
             #Load from disk
-            self.vectorstore = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
-                collection_name="rag_collection"
-            )
+            self.vectorstore = self._new_chroma()
 
             #Verify if have data
             count = self.vectorstore._collection.count()
             if count == 0:
-                print("Vector store is empty.")
+                logger.info("Vector store is empty.")
                 return False
-            print(f"Loaded existing vector store with {count} chunks.")
+            logger.info("Loaded existing vector store with %d chunks.", count)
             return True
         except Exception as e:
-            print(f"Error loading vector store: {str(e)}")
+            logger.error("Error loading vector store: %s", e)
             return False
     
-    def add_documents(self, documents: List[Document]) -> None:
+    def add_documents(self, documents: List[Document], persist: bool = True) -> None:
         """
-        Agrega nuevos documentos a una colección existente
+        Agrega nuevos documentos a la colección (la abre o crea si hace falta)
         
         Útil para:
         - Agregar documentos sin perder los existentes
         - Actualización incremental de la base
+        - Ingesta en batches
         
         Args:
             documents: Lista de Documents a agregar
+            persist: Sin efecto en Chroma (cada upsert ya queda en disco);
+                existe por compatibilidad con FAISSVectorStore
         """
-        if self.vectorstore is None:
-            raise ValueError("Vector store is not initialized. Load or create a vector store first.")
-        
-        print(f" Adding {len(documents)} new chunks to vector store...")
-        self.vectorstore.add_documents(documents)
-        print("New chunks added successfully.")
+        logger.info("Adding %d new chunks to vector store...", len(documents))
+        self._open_collection()
+        self._embed_and_add(documents)
+        logger.info("New chunks added successfully.")
+
+    def persist(self) -> None:
+        """Chroma persiste cada upsert; existe por compatibilidad con FAISSVectorStore"""
 
     def similarity_search(self, query: str, k: int = 3) -> List[Document]:
         """
         Busca los k documentos más similares a la query
         
         Algoritmo de búsqueda (simplificado):
-        1. query → embeddings.embed_query(query) → vector_query
+        1. query → embedder.embed_query_cached(query) → vector_query
+           (la API solo se llama la primera vez para cada pregunta)
         2. Para cada vector en la DB:
            - Calcular similitud: cosine_similarity(vector_query, vector_db)
         3. Ordenar por similitud (de mayor a menor)
@@ -170,7 +417,8 @@ class VectorStore:
         if self.vectorstore is None:
             raise ValueError("Vector store is not initialized. Load or create a vector store first.")
         
-        results = self.vectorstore.similarity_search(query, k=k)
+        vector = self.embedder.embed_query_cached(query)
+        results = self.vectorstore.similarity_search_by_vector(vector, k=k)
         return results
     
     def similarity_search_with_score(self, query: str, k: int = 3) -> List[tuple]:
@@ -194,8 +442,63 @@ class VectorStore:
 
         if self.vectorstore is None:
             raise ValueError("Vector store is not initialized. Load or create a vector store first.")
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
-        return results
+        vector = self.embedder.embed_query_cached(query)
+        return self.similarity_search_by_vector_with_score(vector, k=k)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: List[float], k: int = 3
+    ) -> List[Tuple[Document, float]]:
+        """
+        Igual que similarity_search_with_score, pero con la query ya vectorizada
+
+        Permite reutilizar un embedding cacheado y ahorrar la llamada a la API.
+
+        Returns:
+            Lista de tuplas: (Document, score)
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store is not initialized. Load or create a vector store first.")
+        return self.vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+
+    def raw_search_many(
+        self, embeddings: List[List[float]], k: int = 3, include_embeddings: bool = False
+    ) -> List[Tuple[List[str], List[dict], List[float], Optional[list]]]:
+        """
+        Busca varias consultas con la API nativa de Chroma, en una sola llamada
+
+        similarity_search envuelve cada resultado en un Document; aquí se
+        devuelven directo las listas que retorna collection.query, sin
+        crear un objeto por resultado.
+
+        Args:
+            embeddings: Queries ya vectorizadas (ver Embedder.embed_query_cached)
+            k: Número de resultados por query
+            include_embeddings: Si es True también retorna los vectores
+                guardados de cada resultado (para re-ranking)
+
+        Returns:
+            Por cada embedding, (textos, metadatas, distancias, vectores o
+            None), ordenados de más a menos similar
+        """
+        if self.vectorstore is None:
+            raise ValueError("Vector store is not initialized. Load or create a vector store first.")
+
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        results = self.vectorstore._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            include=include
+        )
+        all_embeddings = results["embeddings"] if include_embeddings else [None] * len(embeddings)
+        return [
+            (texts, [metadata or {} for metadata in metadatas], distances, vectors)
+            for texts, metadatas, distances, vectors in zip(
+                results["documents"], results["metadatas"], results["distances"], all_embeddings
+            )
+        ]
+
     def delete_collection(self) -> None:
         """
         Elimina completamente la colección
@@ -204,10 +507,28 @@ class VectorStore:
         - Reset completo
         - Limpiar antes de re-indexar
         - Testing
+
+        También cierra el cliente de chromadb, así se puede borrar
+        persist_directory después (ver _release_client).
         """
         if self.vectorstore:
             self.vectorstore.delete_collection()
-            print("Vector store collection deleted.")
+            self.vectorstore = None
+            self.index_params = None
+            logger.info("Vector store collection deleted.")
         else:
-            print("Vector store is not initialized. Nothing to delete.")
+            logger.info("Vector store is not initialized. Nothing to delete.")
+        self._release_client()
 
+    @staticmethod
+    def _release_client() -> None:
+        """
+        Descarta los clientes de chromadb cacheados en el proceso
+
+        chromadb guarda un cliente por ruta (SharedSystemClient) con el
+        SQLite abierto; si vector_db/ se borra y se recrea, el próximo
+        PersistentClient reusaría ese cliente y escribiría en el archivo
+        ya borrado (todo lo ingestado se perdería al reiniciar).
+        """
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
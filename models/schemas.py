@@ -4,7 +4,7 @@
 """
 
 import json
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 
 class IngestResponse(BaseModel):
@@ -13,28 +13,36 @@ class IngestResponse(BaseModel):
     files_proccessed: int
     chunks_created: int
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "message": "Ingestion completed successfully.",
                 "files_proccessed": 3,
                 "chunks_created": 1500
             }
         }
+    )
 
 
 class QueryRequest(BaseModel):
     """Request to do a query"""
     question: str = Field(..., min_length=1, description="User Question to ask the system")
     top_k: Optional[int] = Field(3, ge=1, le=10, description="Number of chunks to retrieve")
+    score_threshold: Optional[float] = Field(
+        None, ge=0, description="Max distance (lower = more similar) for a chunk to be used"
+    )
 
-    class Config:
-        json_schema_extra = {
-            "examople": {
+    model_config = ConfigDict(
+        frozen=True,
+        extra="ignore",
+        json_schema_extra={
+            "example": {
                 "question": "What is a auditory process",
                 "top_k": 3
             }
         }
+    )
 
 
 class SourceInfo(BaseModel):
@@ -43,14 +51,17 @@ class SourceInfo(BaseModel):
     chunk_id: int
     content_preview: str
 
+    model_config = ConfigDict(frozen=True)
+
 class QueryResponse(BaseModel):
     """Response with model answer"""
     answer: str
     source: List[SourceInfo]
     chunk_used: int
 
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "answer": "The process of auditory perception involves the detection and interpretation of sound waves by the ear and brain.",
                 "source": [
@@ -62,4 +73,5 @@ class QueryResponse(BaseModel):
                 ],
                 "chunk_used": 3
             }
-        }
\ No newline at end of file
+        }
+    )
\ No newline at end of file
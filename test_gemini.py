@@ -99,14 +99,15 @@ try:
     print(f"   ✅ {len(vectors)} vectores generados")
     
     # Calcular similitud aproximada entre primeros dos (deberían ser similares)
-    from numpy import dot
-    from numpy.linalg import norm
+    # Normalizar filas y multiplicar: S[i, j] = coseno(vector i, vector j)
+    import numpy as np
     
-    def cosine_similarity(v1, v2):
-        return dot(v1, v2) / (norm(v1) * norm(v2))
+    V = np.asarray(vectors, dtype=np.float32)
+    V /= np.linalg.norm(V, axis=1, keepdims=True)
+    S = V @ V.T
     
-    sim_12 = cosine_similarity(vectors[0], vectors[1])
-    sim_13 = cosine_similarity(vectors[0], vectors[2])
+    sim_12 = S[0, 1]
+    sim_13 = S[0, 2]
     
     print(f"   📊 Similitud 'gato/casa' vs 'felino/hogar': {sim_12:.3f}")
     print(f"   📊 Similitud 'gato/casa' vs 'coche rojo': {sim_13:.3f}")